@@ -6,18 +6,28 @@
 # - Add/Edit PMs, Log Completion, CSV import/export, bulk meter update, printable schedule
 # - Optimized for snappy loads
 
+import io
 import os
+import calendar
 from datetime import datetime, timedelta, date
-from dateutil.relativedelta import relativedelta
 
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import streamlit as st
 
+try:  # optional JIT for the meter kernels; the NumPy versions are used without it
+    import numba as nb
+except ImportError:
+    nb = None
+
 # -----------------------
 # Config
 # -----------------------
 st.set_page_config(page_title="Maintenance PM Dashboard", page_icon="🛠️", layout="wide")
-DATA_FILE = "pm_data.csv"
+DATA_FILE = "pm_data.csv"         # legacy store; only read once to seed STORE_FILE
+STORE_FILE = "pm_data.parquet"
+HASH_COL = "InputsHash"           # stored next to base_columns(): hash of the next-due inputs
 DATE_FMT = "%Y-%m-%d"
 
 PRIORITIES = ["Low", "Medium", "High", "Critical"]
@@ -26,6 +36,23 @@ INTERVAL_TYPES = ["Days", "Weeks", "Months", "Meter"]
 DUE_SOON_DAYS_DEFAULT = 14
 METER_SOON_THRESHOLD_DEFAULT = 50
 
+# In-memory column types; PARSE_DATES columns are datetime64 (see apply_dtypes)
+TEXT = "string[pyarrow]"  # Arrow-backed text: contiguous UTF-8 buffers, C kernels for eq/isin/contains/unique
+DTYPES = {
+    "Site": TEXT, "AssetID": TEXT, "AssetName": TEXT, "Component": TEXT, "PMTask": TEXT,
+    "IntervalType": TEXT, "IntervalValue": "Int64",
+    "LastMeter": "Int64", "CurrentMeter": "Int64",
+    "NextDueMeter": "Int64",
+    "Priority": TEXT, "PMStatus": TEXT, "Owner": TEXT, "Notes": TEXT,
+}
+PARSE_DATES = ["LastDoneDate", "NextDueDate"]
+# CSV side reads numbers and dates as text: apply_dtypes coerces them like safe_int / parse_date
+# ("1,200"/"1300 hrs" -> NA, 1600.7 -> 1600, 20240101 -> 2024-01-01 rather than int64 nanoseconds)
+CSV_DTYPES = {**{c: (TEXT if t == "Int64" else t) for c, t in DTYPES.items()}, **{c: TEXT for c in PARSE_DATES}}
+MISSING = np.iinfo(np.int64).min  # NA sentinel in the int64 meter kernels
+JIT_MIN_ROWS = 20_000             # smaller tables stay on NumPy (no JIT dispatch / thread startup)
+STATUS_LABELS = np.array(["Unknown", "Overdue", "Due Soon", "OK"], dtype=object)  # status_meter codes
+
 # -----------------------
 # Helper functions
 # -----------------------
@@ -33,20 +60,47 @@ def today_str(): return date.today().strftime(DATE_FMT)
 
 def parse_date(s):
     if pd.isna(s) or s == "": return None
-    if isinstance(s, (date, datetime)): return s if isinstance(s, date) else s.date()
+    if isinstance(s, (date, datetime)): return s.date() if isinstance(s, datetime) else s
     try: return datetime.strptime(str(s), DATE_FMT).date()
     except Exception:
         try: return pd.to_datetime(s).date()
         except Exception: return None
 
+def parse_date_col(s):
+    # Column version of parse_date: one ISO pass, lenient parse only for the leftovers
+    out = pd.to_datetime(s, format=DATE_FMT, errors="coerce")
+    miss = out.isna() & s.notna() & s.astype(str).str.strip().ne("")
+    if miss.any(): out[miss] = pd.to_datetime([parse_date(v) for v in s[miss]], errors="coerce")  # zone/time dropped
+    return out
+
+def add_months(d, n):
+    # Calendar-month step, clamped to month end (Jan 31 + 1 -> Feb 28/29)
+    m0 = d.month - 1 + n
+    y, m = d.year + m0 // 12, m0 % 12 + 1
+    return d.replace(year=y, month=m, day=min(d.day, calendar.monthrange(y, m)[1]))
+
 def safe_int(v):
     try:
-        if v is None or str(v).strip() == "": return None
+        if v is None or pd.isna(v) or str(v).strip() == "": return None
         return int(float(v))
     except Exception: return None
 
+def to_int_col(s):
+    # Column version of safe_int: truncated Int64, NA for text, inf and values past int64
+    v = pd.to_numeric(s, errors="coerce")
+    if v.dtype.kind == "f":
+        v = v.astype("float64")
+        v = np.trunc(v.where(np.isfinite(v) & (v.abs() < 2**63)))
+    return v.astype("Int64")
+
+def cell_text(df, idx, col):
+    # Form default for a cell: "" for new rows and missing values
+    if idx is None or pd.isna(df.at[idx, col]): return ""
+    return str(df.at[idx, col])
+
 def compute_next_due(row):
-    t = (row.get("IntervalType") or "").strip()
+    t = row.get("IntervalType")
+    t = t.strip() if isinstance(t, str) else ""
     iv = safe_int(row.get("IntervalValue"))
     ld = parse_date(row.get("LastDoneDate"))
     lm = safe_int(row.get("LastMeter"))
@@ -57,7 +111,7 @@ def compute_next_due(row):
         base = ld or date.today()
         if t=="Days": nd_date = base + timedelta(days=iv)
         elif t=="Weeks": nd_date = base + timedelta(weeks=iv)
-        else: nd_date = base + relativedelta(months=iv)
+        else: nd_date = add_months(base, iv)
     elif t=="Meter":
         if not iv or iv <= 0: return None, None
         if lm is None:
@@ -67,31 +121,59 @@ def compute_next_due(row):
             nd_meter = lm + iv
     return nd_date, nd_meter
 
-def compute_status(row, due_soon_days, meter_soon):
-    t = (row.get("IntervalType") or "").strip()
-    if t in ["Days","Weeks","Months"]:
-        nd = parse_date(row.get("NextDueDate"))
-        if not nd: s, delta = "Unknown", None
-        else:
-            days_left = (nd - date.today()).days
-            delta = days_left
-            if days_left < 0: s = "Overdue"
-            elif days_left <= due_soon_days: s = "Due Soon"
-            else: s = "OK"
-    elif t=="Meter":
-        ndm, cm = safe_int(row.get("NextDueMeter")), safe_int(row.get("CurrentMeter"))
-        if ndm is None or cm is None: s, delta = "Unknown", None
-        else:
-            meters_left = ndm - cm
-            delta = meters_left
-            if meters_left < 0: s = "Overdue"
-            elif meters_left <= meter_soon: s = "Due Soon"
-            else: s = "OK"
-    else:
-        s, delta = "Unknown", None
-    pm_state = (row.get("PMStatus") or "Active").strip()
-    if pm_state in ["Paused","Retired"]: s = pm_state
-    return s, delta
+def as_int64(s): return s.to_numpy(dtype="int64", na_value=MISSING)
+
+def next_due_meter(lm, iv, cm):
+    # LastMeter + interval, falling back to CurrentMeter, then 0
+    return np.where(lm != MISSING, lm, np.where(cm != MISSING, cm, 0)) + iv
+
+def status_meter(ndm, cm, soon):
+    # int8 index into STATUS_LABELS
+    left = ndm - cm
+    return np.select([(ndm == MISSING) | (cm == MISSING), left < 0, left <= soon], [0, 1, 2], 3).astype(np.int8)
+
+@st.cache_resource(show_spinner=False)
+def meter_kernels(jit):
+    # (next_due_meter, status_meter); compiled once per process, not on every Streamlit rerun
+    if not jit: return next_due_meter, status_meter
+
+    @nb.njit(parallel=True)
+    def next_due_meter_jit(lm, iv, cm):
+        out = np.empty_like(iv)
+        for i in nb.prange(iv.size):
+            base = lm[i] if lm[i] != MISSING else (cm[i] if cm[i] != MISSING else 0)
+            out[i] = base + iv[i]
+        return out
+
+    @nb.njit(parallel=True)
+    def status_meter_jit(ndm, cm, soon):
+        out = np.empty(ndm.size, dtype=np.int8)
+        for i in nb.prange(ndm.size):
+            if ndm[i] == MISSING or cm[i] == MISSING: out[i] = 0
+            elif ndm[i] - cm[i] < 0: out[i] = 1
+            elif ndm[i] - cm[i] <= soon: out[i] = 2
+            else: out[i] = 3
+        return out
+
+    return next_due_meter_jit, status_meter_jit
+
+def kernels_for(n): return meter_kernels(nb is not None and n >= JIT_MIN_ROWS)
+
+def compute_status_vectorized(df, due_soon_days, meter_soon, today):
+    # Vectorized compute_status as of `today`: (status, delta) Series aligned to df.index
+    it = df["IntervalType"].fillna("").str.strip()
+    is_time, is_meter = it.isin(["Days","Weeks","Months"]), it.eq("Meter")
+    nd = df["NextDueDate"].to_numpy().astype("datetime64[D]")  # day units: no ns overflow for far dates
+    days_left = np.where(np.isnat(nd), np.nan, (nd - np.datetime64(today, "D")).astype("float64"))
+    ndm, cm = as_int64(df["NextDueMeter"]), as_int64(df["CurrentMeter"])
+    meters_left = np.where((ndm != MISSING) & (cm != MISSING), ndm - cm, np.nan)
+    delta = pd.Series(np.where(is_time, days_left, np.where(is_meter, meters_left, np.nan)), index=df.index)
+    time_codes = np.select([np.isnan(days_left), days_left < 0, days_left <= due_soon_days], [0, 1, 2], 3)
+    meter_codes = kernels_for(len(df))[1](ndm, cm, meter_soon)
+    status = STATUS_LABELS[np.where(is_time, time_codes, np.where(is_meter, meter_codes, 0))]
+    pm_state = df["PMStatus"].fillna("Active").str.strip()
+    status = np.where(pm_state.isin(["Paused","Retired"]), pm_state, status)
+    return pd.Series(status, index=df.index), delta.astype("Int64")
 
 def base_columns():
     return [
@@ -108,12 +190,49 @@ def ensure_columns(df):
         if c not in df.columns: df[c] = None
     return df[cols]
 
+def apply_dtypes(df):
+    # Bring any incoming frame (CSV, parquet, sample or form rows) to DTYPES / PARSE_DATES
+    df = ensure_columns(df).copy()
+    for c, t in DTYPES.items():
+        df[c] = to_int_col(df[c]) if t == "Int64" else df[c].astype(t)
+    for c in PARSE_DATES: df[c] = parse_date_col(df[c]).astype("datetime64[ns]")
+    return df
+
+def read_pm_csv(src):
+    # Typed parse in the C reader; apply_dtypes adds missing columns and parses dates
+    return apply_dtypes(pd.read_csv(src, dtype=CSV_DTYPES))
+
+def input_hash(df):
+    # Row hash of everything compute_next_due reads (on the typed frame)
+    return pd.util.hash_pandas_object(
+        df[["IntervalType","IntervalValue","LastDoneDate","LastMeter","CurrentMeter"]], index=False)
+
 def recompute_all(df):
+    # Vectorized compute_next_due over a typed (apply_dtypes) table
     df = df.copy()
-    for i, row in df.iterrows():
-        nd_date, nd_meter = compute_next_due(row)
-        df.at[i,"NextDueDate"] = nd_date.strftime(DATE_FMT) if isinstance(nd_date,(date,datetime)) else None
-        df.at[i,"NextDueMeter"] = nd_meter if nd_meter is not None else None
+    it = df["IntervalType"].fillna("").str.strip()
+    iv = df["IntervalValue"].astype("float64")
+    ld = df["LastDoneDate"].fillna(pd.Timestamp(date.today()))
+    nd_date = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    nd_meter = pd.Series(pd.NA, index=df.index, dtype="Int64")
+    valid = iv > 0
+    # Due dates past datetime64[ns] (April 2262) stay NaT instead of overflowing
+    room_days = (np.datetime64(pd.Timestamp.max, "D") - ld.to_numpy().astype("datetime64[D]")).astype("int64")
+    room_months = (pd.Timestamp.max.year - ld.dt.year) * 12 + (pd.Timestamp.max.month - ld.dt.month) - 1
+    for t, unit, days in (("Days","D",1), ("Weeks","W",7)):
+        m = it.eq(t) & valid & (iv * days <= room_days)
+        nd_date[m] = ld[m] + pd.to_timedelta(iv[m], unit=unit)
+    m = it.eq("Months") & valid & (iv <= room_months)
+    for n in iv[m].unique():  # one offset per distinct month count
+        sub = m & iv.eq(n)
+        nd_date[sub] = ld[sub] + pd.DateOffset(months=int(n))
+    m = (it.eq("Meter") & valid).to_numpy(dtype=bool)
+    if m.any():
+        sub = df[m]
+        nd_meter[m] = kernels_for(len(sub))[0](
+            as_int64(sub["LastMeter"]), as_int64(sub["IntervalValue"]), as_int64(sub["CurrentMeter"]))
+    df["NextDueDate"] = nd_date
+    df["NextDueMeter"] = nd_meter
     return df
 
 def sample_data():
@@ -122,36 +241,99 @@ def sample_data():
         dict(Site="Main Plant", AssetID="CMP-401", AssetName="Air Compressor #1",
              Component="Compressor", PMTask="Change oil & filter",
              IntervalType="Months", IntervalValue="6",
-             LastDoneDate=(t - relativedelta(months=7)).strftime(DATE_FMT),
+             LastDoneDate=add_months(t, -7).strftime(DATE_FMT),
              LastMeter="", CurrentMeter="", NextDueDate="", NextDueMeter="",
              Priority="High", PMStatus="Active", Owner="Keith", Notes="Use ISO 68"),
         dict(Site="Main Plant", AssetID="FLT-112", AssetName="Forklift A",
              Component="Engine", PMTask="Service @ every 200 hrs",
              IntervalType="Meter", IntervalValue="200",
-             LastDoneDate=(t - relativedelta(months=2)).strftime(DATE_FMT),
+             LastDoneDate=add_months(t, -2).strftime(DATE_FMT),
              LastMeter="1400", CurrentMeter="1585", NextDueDate="", NextDueMeter="",
              Priority="Medium", PMStatus="Active", Owner="Shop", Notes=""),
         dict(Site="Warehouse", AssetID="FAN-020", AssetName="Exhaust Fan",
              Component="Motor", PMTask="Grease bearings",
              IntervalType="Weeks", IntervalValue="12",
-             LastDoneDate=(t - relativedelta(weeks=10)).strftime(DATE_FMT),
+             LastDoneDate=(t - timedelta(weeks=10)).strftime(DATE_FMT),
              LastMeter="", CurrentMeter="", NextDueDate="", NextDueMeter="",
              Priority="Low", PMStatus="Paused", Owner="Vendor", Notes="Awaiting parts"),
     ])
 
-def load_data():
-    if os.path.exists(DATA_FILE): df = pd.read_csv(DATA_FILE, dtype=str)
-    else:
-        df = sample_data(); df.to_csv(DATA_FILE, index=False)
-    df = ensure_columns(df)
-    df = recompute_all(df)
+@st.cache_data(show_spinner=False)
+def _load_data_cached(path, mtime, today):
+    # mtime and today are only part of the cache key: a rewritten file, or a new day for the
+    # rows counted from today, gets a fresh entry
+    cols = base_columns() + ([HASH_COL] if HASH_COL in pq.read_schema(path).names else [])
+    df = pd.read_parquet(path, columns=cols)
+    stored = df.pop(HASH_COL) if HASH_COL in df else None
+    df = apply_dtypes(df)
+    # Recompute only rows whose inputs changed since the last save, that have nothing
+    # computed yet, or whose due date hangs off "today" (no LastDoneDate)
+    need = (df["NextDueDate"].isna() & df["NextDueMeter"].isna()) | df["LastDoneDate"].isna()
+    need |= stored.ne(input_hash(df)).fillna(True) if stored is not None else True
+    if need.any():
+        df.loc[need, ["NextDueDate","NextDueMeter"]] = recompute_all(df[need])[["NextDueDate","NextDueMeter"]]
     return df
 
+def load_data():
+    if not os.path.exists(STORE_FILE):
+        seed = read_pm_csv(DATA_FILE) if os.path.exists(DATA_FILE) else apply_dtypes(sample_data())
+        save_data(recompute_all(seed))
+    return _load_data_cached(STORE_FILE, os.path.getmtime(STORE_FILE), date.today())
+
 def save_data(df):
-    ensure_columns(df).to_csv(DATA_FILE, index=False)
+    # Parquet is the working store; CSV is only produced by the export buttons
+    out = apply_dtypes(df)
+    out[HASH_COL] = input_hash(out)
+    out.to_parquet(STORE_FILE, index=False)
+    _load_data_cached.clear()
+    st.session_state.pop("_status", None)
+    st.session_state.pop("_search", None)
+    st.session_state._data_version = st.session_state.get("_data_version", 0) + 1  # picklists / render_frames key
+
+def frame_hash(d): return pd.util.hash_pandas_object(d).values.tobytes()
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: frame_hash})
+def compute_status_frame(df, due_soon_days, meter_soon, today):
+    return compute_status_vectorized(df, due_soon_days, meter_soon, today)
+
+def current_status():
+    # (status, delta) for st.session_state.df, shared by KPIs, filters and the table; save_data drops it
+    key = (id(st.session_state.df), st.session_state.due_soon_days, st.session_state.meter_soon, date.today())
+    cached = st.session_state.get("_status")
+    if cached is None or cached[0] != key:
+        cached = st.session_state["_status"] = (key, *compute_status_frame(st.session_state.df, *key[1:]))
+    return cached[1], cached[2]
+
+def picklists():
+    # Sidebar Site/Asset options and "i: Asset • Task" row labels (Series by row index), per data version
+    df = st.session_state.df
+    key = (id(df), st.session_state._data_version)
+    cached = st.session_state.get("_picklists")
+    if cached is None or cached[0] != key:
+        sites = sorted(df["Site"].dropna().unique().tolist())
+        assets = sorted(df["AssetName"].dropna().unique().tolist())
+        labels = [f"{i}: {a} • {t}" for i, a, t in zip(df.index, df["AssetName"].to_numpy(), df["PMTask"].to_numpy())]
+        cached = st.session_state["_picklists"] = (key, sites, assets, pd.Series(labels, index=df.index))
+    return cached[1:]
+
+def search_blob():
+    # Lowercased task/component/asset/notes text per row, one column scan per search; save_data drops it
+    df = st.session_state.df
+    cached = st.session_state.get("_search")
+    if cached is None or cached[0] != id(df):
+        blob = df["PMTask"].astype(TEXT).fillna("")
+        for c in ["Component","AssetName","Notes"]: blob = blob + "\x1f" + df[c].astype(TEXT).fillna("")
+        cached = st.session_state["_search"] = (id(df), blob.str.lower())
+    return cached[1]
+
+def set_status_filter(label): st.session_state.status_filter = label  # KPI on_click, runs before the rerun
 
 def export_csv_button(df, label="Download CSV"):
-    st.download_button(label=label, data=df.to_csv(index=False),
+    # Written in row chunks straight into a bytes buffer, no intermediate str of the whole file
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, chunksize=10_000, date_format=DATE_FMT)
+    buf.seek(0)
+    st.download_button(label=label, data=buf,
                        file_name=f"pm_export_{today_str()}.csv",
                        mime="text/csv", use_container_width=True)
 
@@ -162,6 +344,7 @@ if "df" not in st.session_state: st.session_state.df = load_data()
 if "due_soon_days" not in st.session_state: st.session_state.due_soon_days = DUE_SOON_DAYS_DEFAULT
 if "meter_soon" not in st.session_state: st.session_state.meter_soon = METER_SOON_THRESHOLD_DEFAULT
 if "status_filter" not in st.session_state: st.session_state.status_filter = None  # set by KPI clicks
+if "_data_version" not in st.session_state: st.session_state._data_version = 0  # bumped by save_data
 
 # -----------------------
 # Sidebar
@@ -172,9 +355,7 @@ with st.sidebar:
     up = st.file_uploader("Replace current data with a CSV", type=["csv"])
     if up is not None:
         try:
-            nd = pd.read_csv(up, dtype=str)
-            nd = ensure_columns(nd)
-            st.session_state.df = recompute_all(nd)
+            st.session_state.df = recompute_all(read_pm_csv(up))
             save_data(st.session_state.df)
             st.success("Imported and saved.")
         except Exception as e:
@@ -187,9 +368,8 @@ with st.sidebar:
         min_value=1, max_value=2000, value=st.session_state.meter_soon, step=5)
 
     st.subheader("Filters")
-    df_all = st.session_state.df
-    sites = ["(All)"] + sorted(df_all["Site"].dropna().unique().tolist())
-    assets = ["(All)"] + sorted(df_all["AssetName"].dropna().unique().tolist())
+    sites, assets, _ = picklists()
+    sites, assets = ["(All)"] + sites, ["(All)"] + assets
     site_f = st.selectbox("Site", sites, index=0)
     asset_f = st.selectbox("Asset", assets, index=0)
     priority_f = st.selectbox("Priority", ["(All)"] + PRIORITIES, index=0)
@@ -200,7 +380,7 @@ with st.sidebar:
     q = st.text_input("Search (task, component, asset, notes)")
 
     st.subheader("Actions")
-    if st.button("💾 Save to pm_data.csv", use_container_width=True):
+    if st.button("💾 Save", use_container_width=True):
         save_data(st.session_state.df); st.success("Saved.")
     export_csv_button(st.session_state.df, "⬇️ Export current table")
 
@@ -217,28 +397,7 @@ with tab1:
     st.caption("Tap a KPI button to filter. ‘Clear Filter’ resets it. Red = late, Yellow = almost due, Green = fine.")
 
     # ---------- KPI buttons (fully clickable) ----------
-    counts = {"Overdue":0,"Due Soon":0,"OK":0,"Unknown":0,"Paused":0,"Retired":0}
-    for _, r in st.session_state.df.iterrows():
-        s, _ = compute_status(r, st.session_state.due_soon_days, st.session_state.meter_soon)
-        counts[s] = counts.get(s, 0) + 1
-
-    c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
-    def kpi_button(col, label):
-        with col:
-            if st.button(f"{label}\n{counts[label]}", key=f"kpi_{label.replace(' ','_')}", use_container_width=True):
-                st.session_state.status_filter = label
-
-    kpi_button(c1, "Overdue")
-    kpi_button(c2, "Due Soon")
-    kpi_button(c3, "OK")
-    kpi_button(c4, "Unknown")
-    kpi_button(c5, "Paused")
-    kpi_button(c6, "Retired")
-
-    with c7:
-        if st.button("Clear Filter", key="kpi_clear", use_container_width=True):
-            st.session_state.status_filter = None
-        st.caption(f"Active KPI filter: **{st.session_state.status_filter or '(none)'}**")
+    kpi_row = st.container()  # filled after the forms, once this run's counts are known
 
     st.divider()
 
@@ -249,33 +408,33 @@ with tab1:
         mode = st.radio("Mode", ["Add New", "Edit Existing"], horizontal=True)
         idx = None
         if mode == "Edit Existing" and len(df):
-            pick = st.selectbox("Select PM row", [f"{i}: {r.AssetName} • {r.PMTask}" for i, r in df.iterrows()], index=0)
+            pick = st.selectbox("Select PM row", picklists()[2].tolist(), index=0)
             idx = int(pick.split(":")[0])
 
         c1, c2, c3, c4 = st.columns(4)
         with c1:
-            site = st.text_input("Site", value=(df.at[idx,"Site"] if idx is not None else ""))
-            asset_id = st.text_input("Asset ID", value=(df.at[idx,"AssetID"] if idx is not None else ""))
-            asset_name = st.text_input("Asset Name", value=(df.at[idx,"AssetName"] if idx is not None else ""))
+            site = st.text_input("Site", value=cell_text(df, idx, "Site"))
+            asset_id = st.text_input("Asset ID", value=cell_text(df, idx, "AssetID"))
+            asset_name = st.text_input("Asset Name", value=cell_text(df, idx, "AssetName"))
         with c2:
-            component = st.text_input("Component", value=(df.at[idx,"Component"] if idx is not None else ""))
-            task = st.text_input("PM Task", value=(df.at[idx,"PMTask"] if idx is not None else ""))
-            owner = st.text_input("Owner", value=(df.at[idx,"Owner"] if idx is not None else ""))
+            component = st.text_input("Component", value=cell_text(df, idx, "Component"))
+            task = st.text_input("PM Task", value=cell_text(df, idx, "PMTask"))
+            owner = st.text_input("Owner", value=cell_text(df, idx, "Owner"))
         with c3:
             interval_type = st.selectbox("Interval Type", INTERVAL_TYPES,
-                index=(INTERVAL_TYPES.index(df.at[idx,"IntervalType"]) if idx is not None and df.at[idx,"IntervalType"] in INTERVAL_TYPES else 0))
+                index=(INTERVAL_TYPES.index(cell_text(df, idx, "IntervalType")) if cell_text(df, idx, "IntervalType") in INTERVAL_TYPES else 0))
             interval_value = st.number_input("Interval Value", 0, 100000,
-                value=int(float(df.at[idx,"IntervalValue"])) if idx is not None and str(df.at[idx,"IntervalValue"]).strip() not in ["","None","nan"] else 0)
+                value=int(cell_text(df, idx, "IntervalValue") or 0))
             priority = st.selectbox("Priority", PRIORITIES,
-                index=(PRIORITIES.index(df.at[idx,"Priority"]) if idx is not None and df.at[idx,"Priority"] in PRIORITIES else 1))
+                index=(PRIORITIES.index(cell_text(df, idx, "Priority")) if cell_text(df, idx, "Priority") in PRIORITIES else 1))
         with c4:
             pm_status = st.selectbox("PM Status", STATUSES,
-                index=(STATUSES.index(df.at[idx,"PMStatus"]) if idx is not None and df.at[idx,"PMStatus"] in STATUSES else 0))
+                index=(STATUSES.index(cell_text(df, idx, "PMStatus")) if cell_text(df, idx, "PMStatus") in STATUSES else 0))
             last_done_date = st.date_input("Last Done Date", value=parse_date(df.at[idx,"LastDoneDate"]) if idx is not None and parse_date(df.at[idx,"LastDoneDate"]) else date.today())
-            last_meter = st.text_input("Last Meter", value=(df.at[idx,"LastMeter"] if idx is not None and str(df.at[idx,"LastMeter"])!="nan" else ""))
-            current_meter = st.text_input("Current Meter", value=(df.at[idx,"CurrentMeter"] if idx is not None and str(df.at[idx,"CurrentMeter"])!="nan" else ""))
+            last_meter = st.text_input("Last Meter", value=cell_text(df, idx, "LastMeter"))
+            current_meter = st.text_input("Current Meter", value=cell_text(df, idx, "CurrentMeter"))
 
-        notes = st.text_area("Notes", value=(df.at[idx,"Notes"] if idx is not None and str(df.at[idx,"Notes"])!="nan" else ""))
+        notes = st.text_area("Notes", value=cell_text(df, idx, "Notes"))
 
         cL, cR = st.columns(2)
         with cL:
@@ -283,21 +442,20 @@ with tab1:
                 row = dict(
                     Site=site.strip(), AssetID=asset_id.strip(), AssetName=asset_name.strip(),
                     Component=component.strip(), PMTask=task.strip(),
-                    IntervalType=interval_type, IntervalValue=str(interval_value) if interval_value else "",
-                    LastDoneDate=last_done_date.strftime(DATE_FMT) if last_done_date else "",
-                    LastMeter=str(last_meter).strip() if last_meter else "",
-                    CurrentMeter=str(current_meter).strip() if current_meter else "",
-                    NextDueDate="", NextDueMeter="",
+                    IntervalType=interval_type, IntervalValue=interval_value or None,
+                    LastDoneDate=pd.Timestamp(last_done_date) if last_done_date else None,
+                    LastMeter=safe_int(last_meter), CurrentMeter=safe_int(current_meter),
+                    NextDueDate=None, NextDueMeter=None,
                     Priority=priority, PMStatus=pm_status, Owner=owner.strip(), Notes=notes.strip()
                 )
                 nd_date, nd_meter = compute_next_due(row)
-                row["NextDueDate"] = nd_date.strftime(DATE_FMT) if isinstance(nd_date,(date,datetime)) else ""
-                row["NextDueMeter"] = nd_meter if nd_meter is not None else ""
+                row["NextDueDate"] = pd.to_datetime(nd_date, errors="coerce")  # NaT past 2262
+                row["NextDueMeter"] = nd_meter
                 if mode == "Edit Existing" and idx is not None:
-                    for k, v in row.items(): st.session_state.df.at[idx, k] = v
+                    st.session_state.df.loc[idx, list(row)] = list(row.values())
                     st.success("PM updated.")
                 else:
-                    st.session_state.df = pd.concat([st.session_state.df, pd.DataFrame([row])], ignore_index=True)
+                    st.session_state.df = pd.concat([st.session_state.df, apply_dtypes(pd.DataFrame([row]))], ignore_index=True)
                     st.success("PM created.")
                 save_data(st.session_state.df)
         with cR:
@@ -311,84 +469,103 @@ with tab1:
     with st.expander("Update a PM as completed", expanded=False):
         df = st.session_state.df
         if len(df):
-            pick = st.selectbox("Select PM to log", [f"{i}: {r.AssetName} • {r.PMTask}" for i, r in df.iterrows()], index=0)
+            pick = st.selectbox("Select PM to log", picklists()[2].tolist(), index=0)
             i_sel = int(pick.split(":")[0])
             new_date = st.date_input("Completion Date", value=date.today())
             new_meter = st.text_input("Completion Meter (optional)", value="")
             if st.button("✔️ Log Completion", use_container_width=True):
-                st.session_state.df.at[i_sel,"LastDoneDate"] = new_date.strftime(DATE_FMT)
-                if (st.session_state.df.at[i_sel,"IntervalType"] == "Meter") and new_meter.strip():
-                    st.session_state.df.at[i_sel,"LastMeter"] = new_meter.strip()
-                    st.session_state.df.at[i_sel,"CurrentMeter"] = new_meter.strip()
-                row = st.session_state.df.loc[i_sel].to_dict()
-                nd_date, nd_meter = compute_next_due(row)
-                st.session_state.df.at[i_sel,"NextDueDate"] = nd_date.strftime(DATE_FMT) if isinstance(nd_date,(date,datetime)) else ""
-                st.session_state.df.at[i_sel,"NextDueMeter"] = nd_meter if nd_meter is not None else ""
+                upd = {"LastDoneDate": pd.Timestamp(new_date)}
+                if cell_text(st.session_state.df, i_sel, "IntervalType") == "Meter" and safe_int(new_meter) is not None:
+                    upd["LastMeter"] = upd["CurrentMeter"] = safe_int(new_meter)
+                nd_date, nd_meter = compute_next_due({**st.session_state.df.loc[i_sel].to_dict(), **upd})
+                upd["NextDueDate"] = pd.to_datetime(nd_date, errors="coerce")  # NaT past 2262
+                upd["NextDueMeter"] = nd_meter
+                st.session_state.df.loc[i_sel, list(upd)] = list(upd.values())
                 save_data(st.session_state.df); st.success("Completion logged.")
         else:
             st.info("No PMs available.")
 
     # ---------- Apply filters ----------
     def apply_filters(df_in):
-        out = df_in.copy()
-        if site_f != "(All)": out = out[out["Site"] == site_f]
-        if asset_f != "(All)": out = out[out["AssetName"] == asset_f]
-        if priority_f != "(All)": out = out[out["Priority"] == priority_f]
-        if pmstatus_f != "(All)": out = out[out["PMStatus"] == pmstatus_f]
-        if interval_f: out = out[out["IntervalType"].isin(interval_f)]
+        # All interval types ticked (or none) means no interval filter, same as the other "(All)" choices
+        all_intervals = not interval_f or set(interval_f) == set(INTERVAL_TYPES)
+        no_filters = (site_f == "(All)" and asset_f == "(All)" and priority_f == "(All)" and pmstatus_f == "(All)"
+                      and all_intervals and not st.session_state.status_filter and not (q and q.strip()))
+        if no_filters: return df_in  # default view: no copy, callers only read it
+        # One boolean mask, one indexing pass
+        m = np.ones(len(df_in), dtype=bool)
+        for col, val in (("Site", site_f), ("AssetName", asset_f), ("Priority", priority_f), ("PMStatus", pmstatus_f)):
+            if val != "(All)": m &= df_in[col].eq(val).to_numpy(dtype=bool, na_value=False)
+        if not all_intervals: m &= df_in["IntervalType"].isin(interval_f).to_numpy(dtype=bool, na_value=False)
         # KPI status filter (from buttons)
         if st.session_state.status_filter:
-            keep = []
-            for _, r in out.iterrows():
-                s, _ = compute_status(r, st.session_state.due_soon_days, st.session_state.meter_soon)
-                keep.append(s == st.session_state.status_filter)
-            out = out[pd.Series(keep, index=out.index)]
+            status, _ = current_status()
+            m &= status.loc[df_in.index].eq(st.session_state.status_filter).to_numpy(dtype=bool)
         # Search
         if q and q.strip():
-            ql = q.strip().lower()
-            sel = (
-                out["PMTask"].fillna("").str.lower().str.contains(ql) |
-                out["Component"].fillna("").str.lower().str.contains(ql) |
-                out["AssetName"].fillna("").str.lower().str.contains(ql) |
-                out["Notes"].fillna("").str.lower().str.contains(ql)
-            )
-            out = out[sel]
-        return out
+            m &= search_blob().loc[df_in.index].str.contains(q.strip().lower(), regex=False).to_numpy(dtype=bool, na_value=False)
+        return df_in[m]
 
-    filtered = apply_filters(st.session_state.df)
+    def render_frames():
+        # KPI counts/filtered rows/table for this data version, day, thresholds and filters
+        df = st.session_state.df
+        key = (id(df), st.session_state._data_version, date.today(),
+               st.session_state.due_soon_days, st.session_state.meter_soon,
+               site_f, asset_f, priority_f, pmstatus_f, tuple(interval_f), st.session_state.status_filter, q)
+        cached = st.session_state.get("_render")
+        if cached is None or cached[0] != key:
+            status, delta = current_status()
+            counts = status.value_counts().reindex(["Overdue","Due Soon","OK","Unknown","Paused","Retired"], fill_value=0).to_dict()
+            filtered = apply_filters(df)
+            disp = pd.DataFrame({
+                "DueStatus": status.loc[filtered.index],
+                "Urgency (days/meter left)": delta.loc[filtered.index],
+                **{c: filtered[c] for c in base_columns()},
+            })
+            cached = st.session_state["_render"] = (key, counts, filtered, disp)
+        return cached[1:]
+
+    counts, filtered, disp = render_frames()
+
+    with kpi_row:
+        c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
+        def kpi_button(col, label):
+            with col:
+                st.button(f"{label}\n{counts[label]}", key=f"kpi_{label.replace(' ','_')}", use_container_width=True,
+                          on_click=set_status_filter, args=(label,))
+
+        kpi_button(c1, "Overdue")
+        kpi_button(c2, "Due Soon")
+        kpi_button(c3, "OK")
+        kpi_button(c4, "Unknown")
+        kpi_button(c5, "Paused")
+        kpi_button(c6, "Retired")
+
+        with c7:
+            st.button("Clear Filter", key="kpi_clear", use_container_width=True, on_click=set_status_filter, args=(None,))
+            st.caption(f"Active KPI filter: **{st.session_state.status_filter or '(none)'}**")
 
     # ---------- Display table ----------
-    disp = filtered.copy()
-    due_statuses, urgency = [], []
-    for _, r in disp.iterrows():
-        s, d = compute_status(r, st.session_state.due_soon_days, st.session_state.meter_soon)
-        due_statuses.append(s); urgency.append(d)
-    disp.insert(0, "DueStatus", due_statuses)
-    disp.insert(1, "Urgency (days/meter left)", urgency)
-    view_cols = ["DueStatus","Urgency (days/meter left)"] + base_columns()
-    disp = ensure_columns(disp).reindex(columns=view_cols, fill_value="")
-
     st.subheader("📋 PM List")
     st.caption("Use the KPI buttons above to jump straight to Overdue/Due Soon/OK.")
-    st.dataframe(disp, use_container_width=True, height=520)
+    st.dataframe(disp, use_container_width=True, height=520,
+                 column_config={c: st.column_config.DateColumn(format="YYYY-MM-DD") for c in PARSE_DATES})
 
     # ---------- Bulk meter update ----------
     st.subheader("⛽ Quick Meter Update")
     with st.expander("Update current meter on one or more assets", expanded=False):
         if len(filtered):
-            selection = st.multiselect("Select rows", [f"{i}: {r.AssetName} • {r.PMTask}" for i, r in filtered.iterrows()])
+            labels = picklists()[2]
+            selection = st.multiselect("Select rows", labels.loc[filtered.index].tolist())
             new_cm = st.text_input("New Current Meter value")
             if st.button("Update Meters", use_container_width=True):
-                if not new_cm.strip():
+                if safe_int(new_cm) is None:
                     st.warning("Enter a meter value.")
                 else:
-                    for token in selection:
-                        ix = int(token.split(":")[0])
-                        st.session_state.df.at[ix,"CurrentMeter"] = new_cm.strip()
-                        row = st.session_state.df.loc[ix].to_dict()
-                        nd_date, nd_meter = compute_next_due(row)
-                        st.session_state.df.at[ix,"NextDueDate"] = nd_date.strftime(DATE_FMT) if isinstance(nd_date,(date,datetime)) else ""
-                        st.session_state.df.at[ix,"NextDueMeter"] = nd_meter if nd_meter is not None else ""
+                    ixs = [int(token.split(":")[0]) for token in selection]
+                    st.session_state.df.loc[ixs, "CurrentMeter"] = safe_int(new_cm)
+                    nd = recompute_all(st.session_state.df.loc[ixs])
+                    st.session_state.df.loc[ixs, ["NextDueDate","NextDueMeter"]] = nd[["NextDueDate","NextDueMeter"]]
                     save_data(st.session_state.df); st.success("Meters updated.")
         else:
             st.info("No rows match the current filters.")
@@ -398,7 +575,7 @@ with tab1:
     with st.expander("Compact view for printing", expanded=False):
         compact = filtered.copy()
         compact = compact.assign(
-            Due=lambda d: d.apply(lambda r: parse_date(r["NextDueDate"]).strftime(DATE_FMT) if parse_date(r["NextDueDate"]) else (str(r["NextDueMeter"]) if r["NextDueMeter"] not in [None,"","nan"] else ""), axis=1),
+            Due=lambda d: d["NextDueDate"].dt.strftime(DATE_FMT).fillna(d["NextDueMeter"].astype("string")).fillna(""),
             Type=lambda d: d["IntervalType"], Every=lambda d: d["IntervalValue"],
             Owner=lambda d: d["Owner"].fillna(""), Pri=lambda d: d["Priority"]
         )[